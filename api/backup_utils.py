@@ -2,15 +2,41 @@
 Utility functions for Discord server backup and restoration.
 """
 
-import json
+import io
 import logging
+import mmap
 import os
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Any, AsyncIterable, Dict, List, Optional, Tuple
+
+import aiofiles
+import ijson
+import orjson
+import zstandard as zstd
 
 logger = logging.getLogger(__name__)
 
+def _dumps(data: Any, pretty: bool = False) -> bytes:
+    """Encode data as JSON, indented when pretty output is requested."""
+    option = orjson.OPT_NON_STR_KEYS
+    if pretty:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(data, option=option)
+
+# Buffer size used for backup file I/O
+BUFFER_SIZE = 64 * 1024
+
+# Compressed backups carry this extra suffix (e.g. backup.json.zst)
+ZSTD_SUFFIX = '.zst'
+ZSTD_LEVEL = 3
+
+# File name endings of every backup format
+BACKUP_SUFFIXES = ('.json', '.json' + ZSTD_SUFFIX)
+
+# Record lists longer than this are encoded in batches of this many records
+STREAM_THRESHOLD = 1000
+
 def create_backup_directory(base_dir: str = './backups') -> Path:
     """
     Create a backup directory if it doesn't exist.
@@ -30,7 +56,77 @@ def create_backup_directory(base_dir: str = './backups') -> Path:
     
     return backup_dir
 
-def save_backup(backup_data: Dict, backup_dir: Path, filename: str) -> str:
+def _pack_overwrites(channels: List[Dict]) -> Tuple[List[Dict], List[List[Dict]]]:
+    """
+    Deduplicate the permission overwrites shared by several channels.
+    
+    Args:
+        channels: The channels of the backup
+        
+    Returns:
+        Tuple (channels, templates): channels whose overwrites are replaced by
+        an index into templates, or the original channels and no templates
+        when no overwrites are shared
+    """
+    index_by_key = {}
+    templates = []
+    refs = []
+    
+    for channel in channels:
+        overwrites = channel.get('permission_overwrites')
+        if not overwrites:
+            refs.append(None)
+            continue
+        
+        # Identical overwrite lists encode to identical bytes
+        key = _dumps(overwrites)
+        ref = index_by_key.get(key)
+        if ref is None:
+            ref = index_by_key[key] = len(templates)
+            templates.append(overwrites)
+        refs.append(ref)
+    
+    if len(templates) == len(refs) - refs.count(None):
+        return channels, []
+    
+    packed = [
+        channel if ref is None else {**channel, 'permission_overwrites': ref}
+        for channel, ref in zip(channels, refs)
+    ]
+    return packed, templates
+
+def _unpack_overwrites(backup_data: Dict):
+    """Expand the permission overwrite templates of a loaded backup in place."""
+    templates = backup_data.pop('perm_templates', None)
+    if not templates:
+        return
+    
+    for channel in backup_data.get('channels') or []:
+        ref = channel.get('permission_overwrites')
+        if isinstance(ref, int):
+            channel['permission_overwrites'] = templates[ref]
+
+def _open_backup_writer(backup_path: Path):
+    """Open a backup file for writing, compressing it when it has the .zst suffix."""
+    f = open(backup_path, 'wb', buffering=BUFFER_SIZE)
+    if backup_path.suffix == ZSTD_SUFFIX:
+        return zstd.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(f)
+    return f
+
+def _open_backup_reader(backup_path: str):
+    """Open a backup file for reading, decompressing it when it has the .zst suffix."""
+    f = open(backup_path, 'rb', buffering=BUFFER_SIZE)
+    if str(backup_path).endswith(ZSTD_SUFFIX):
+        return io.BufferedReader(zstd.ZstdDecompressor().stream_reader(f), BUFFER_SIZE)
+    return f
+
+def _timestamped_path(backup_dir: Path, filename: str) -> Path:
+    """Get the path of a new backup file, prefixed with the current timestamp."""
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return backup_dir / f"{timestamp}-{filename}"
+
+def save_backup(backup_data: Dict, backup_dir: Path, filename: str, pretty: bool = False,
+                compress: bool = False) -> str:
     """
     Save backup data to a JSON file.
     
@@ -38,19 +134,94 @@ def save_backup(backup_data: Dict, backup_dir: Path, filename: str) -> str:
         backup_data: The server data to backup
         backup_dir: Directory to save the backup
         filename: Name of the backup file
+        pretty: Write indented JSON instead of compact output
+        compress: Compress the file with zstd (adds the .zst suffix)
         
     Returns:
         Path to the saved backup file
     """
     # Add timestamp to filename
-    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-    filename_with_timestamp = f"{timestamp}-{filename}"
+    backup_path = _timestamped_path(backup_dir, filename)
     
-    backup_path = backup_dir / filename_with_timestamp
+    try:
+        # Overwrites shared by several channels are stored once in "perm_templates",
+        # except in pretty output, which is meant to be read as is
+        if not pretty:
+            channels, templates = _pack_overwrites(backup_data.get('channels') or [])
+            if templates:
+                backup_data = {**backup_data, 'channels': channels, 'perm_templates': templates}
+        
+        if compress:
+            backup_path = backup_path.with_name(backup_path.name + ZSTD_SUFFIX)
+        
+        with _open_backup_writer(backup_path) as f:
+            # Compact output by default, indentation only when asked for;
+            # the whole document is produced as a single bytes blob
+            f.write(_dumps(backup_data, pretty))
+        
+        logger.info(f"Backup saved to: {backup_path}")
+        return str(backup_path)
+    
+    except Exception as e:
+        logger.error(f"Error saving backup: {str(e)}")
+        return None
+
+async def stream_backup(sections: AsyncIterable[Tuple[str, Any]], backup_dir: Path, filename: str,
+                        compress: bool = False) -> Optional[str]:
+    """
+    Stream backup sections to a JSON file as each of them becomes available.
+    
+    Every section is encoded on its own inside a hand-written JSON envelope,
+    so the backup is never gathered in a single dict nor serialized as a
+    single blob, and writing a section overlaps with the fetches of the
+    following ones.
+    
+    Args:
+        sections: (key, value) pairs, written in the order they are yielded
+        backup_dir: Directory to save the backup
+        filename: Name of the backup file
+        compress: Compress the file with zstd (adds the .zst suffix)
+        
+    Returns:
+        Path to the saved backup file, or None if saving failed
+    """
+    backup_path = _timestamped_path(backup_dir, filename)
+    compressor = None
+    if compress:
+        backup_path = backup_path.with_name(backup_path.name + ZSTD_SUFFIX)
+        compressor = zstd.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
     
     try:
-        with open(backup_path, 'w', encoding='utf-8') as f:
-            json.dump(backup_data, f, ensure_ascii=False, indent=4)
+        async with aiofiles.open(backup_path, 'wb', buffering=BUFFER_SIZE) as f:
+            async def write(chunk: bytes):
+                await f.write(compressor.compress(chunk) if compressor else chunk)
+            
+            separator = b'{'
+            templates = []
+            async for key, value in sections:
+                # Overwrites shared by several channels are stored once in "perm_templates"
+                if key == 'channels':
+                    value, templates = _pack_overwrites(value or [])
+                
+                await write(separator + _dumps(key) + b':')
+                separator = b','
+                
+                # Large record lists are encoded in batches to bound the encoding buffer
+                if isinstance(value, list) and len(value) > STREAM_THRESHOLD:
+                    for start in range(0, len(value), STREAM_THRESHOLD):
+                        batch = b','.join(_dumps(record) for record in value[start:start + STREAM_THRESHOLD])
+                        await write((b'[' if start == 0 else b',') + batch)
+                    await write(b']')
+                else:
+                    await write(_dumps(value))
+            
+            if templates:
+                await write(separator + b'"perm_templates":' + _dumps(templates))
+                separator = b','
+            
+            await write(b'{}' if separator == b'{' else b'}')
+            if compressor:
+                await f.write(compressor.flush())
         
         logger.info(f"Backup saved to: {backup_path}")
         return str(backup_path)
@@ -59,19 +230,83 @@ def save_backup(backup_data: Dict, backup_dir: Path, filename: str) -> str:
         logger.error(f"Error saving backup: {str(e)}")
         return None
 
+def _read_field(backup_path: str, key: str) -> Any:
+    """Read the first value found for an ijson prefix in a backup file."""
+    with _open_backup_reader(backup_path) as f:
+        # Parsing stops at the first match
+        return next(ijson.items(f, key), None)
+
+def _expand_field_overwrites(backup_path: str, key: str, value: Any) -> Any:
+    """Replace the permission overwrite references in a field read from the channels."""
+    if key == 'channels.item.permission_overwrites':
+        if not isinstance(value, int):
+            return value
+        return _read_field(backup_path, 'perm_templates')[value]
+    
+    if key == 'channels':
+        channels = value or []
+    elif key == 'channels.item' and isinstance(value, dict):
+        channels = [value]
+    else:
+        return value
+    
+    if any(isinstance(channel.get('permission_overwrites'), int) for channel in channels):
+        # Templates are written after the channels, so they take a second pass
+        _unpack_overwrites({'channels': channels, 'perm_templates': _read_field(backup_path, 'perm_templates')})
+    return value
+
+def load_backup_field(backup_path: str, key: str) -> Any:
+    """
+    Read a single field from a backup file without parsing the whole document.
+    
+    Permission overwrites shared between channels are expanded when the key
+    is 'channels', 'channels.item' or 'channels.item.permission_overwrites'.
+    
+    Args:
+        backup_path: Path to the backup file (.json, optionally .zst)
+        key: ijson prefix of the field to read (e.g. 'server.name')
+        
+    Returns:
+        The first value found for the key, or None if it is missing or loading failed
+    """
+    try:
+        return _expand_field_overwrites(backup_path, key, _read_field(backup_path, key))
+    
+    except FileNotFoundError:
+        logger.error(f"Backup file not found: {backup_path}")
+        return None
+    
+    except ijson.JSONError:
+        logger.error(f"Invalid JSON in backup file: {backup_path}")
+        return None
+    
+    except Exception as e:
+        logger.error(f"Error reading backup field {key}: {str(e)}")
+        return None
+
 def load_backup(backup_path: str) -> Optional[Dict]:
     """
     Load backup data from a JSON file.
     
     Args:
-        backup_path: Path to the backup file
+        backup_path: Path to the backup file (.json, optionally .zst)
         
     Returns:
         The loaded backup data or None if loading failed
     """
     try:
-        with open(backup_path, 'r', encoding='utf-8') as f:
-            backup_data = json.load(f)
+        if str(backup_path).endswith(ZSTD_SUFFIX):
+            with _open_backup_reader(backup_path) as f:
+                backup_data = orjson.loads(f.read())
+        
+        else:
+            # Parse straight from the page cache through a memory map, without
+            # copying the file into a bytes object first
+            with open(backup_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                with memoryview(mm) as view:
+                    backup_data = orjson.loads(view)
+        
+        _unpack_overwrites(backup_data)
         
         logger.info(f"Loaded backup from: {backup_path}")
         return backup_data
@@ -80,7 +315,7 @@ def load_backup(backup_path: str) -> Optional[Dict]:
         logger.error(f"Backup file not found: {backup_path}")
         return None
     
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         logger.error(f"Invalid JSON in backup file: {backup_path}")
         return None
     
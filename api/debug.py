@@ -4,14 +4,19 @@ from datetime import datetime
 
 app = Flask(__name__)
 
+# Le système de fichiers du déploiement ne change plus après le build :
+# on l'inspecte une seule fois au chargement du module
+TEMPLATE_EXISTS = os.path.exists('templates/index.html')
+FILES = os.listdir('.')
+
 @app.route('/debug')
 def debug():
     """Route de debug pour tester les déploiements Vercel"""
     return jsonify({
         'status': 'OK',
         'timestamp': datetime.now().isoformat(),
-        'template_path': os.path.exists('templates/index.html'),
-        'files': os.listdir('.') if os.path.exists('.') else [],
+        'template_path': TEMPLATE_EXISTS,
+        'files': FILES,
         'message': 'Si vous voyez ce message, Vercel fonctionne correctement'
     })
 
@@ -1,11 +1,7 @@
 from flask import Flask, render_template, request, redirect, url_for, flash, session
 import os
 import asyncio
-import json
 import logging
-import threading
-
-from discord_api import DiscordAPI
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
@@ -15,6 +11,36 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__, template_folder=os.path.join(os.path.dirname(__file__), 'templates'))
 app.secret_key = os.environ.get("SESSION_SECRET", "default_secret_key_for_development")
 
+# Boucle d'événements persistante partagée par toutes les requêtes, pour que la
+# session HTTP du client Discord (et ses connexions keep-alive) soit réutilisée.
+# Elle n'est démarrée qu'au premier besoin : les simples GET n'en ont pas l'utilité.
+loop = None
+
+def submit_async(coro):
+    """Planifie une coroutine sur la boucle persistante et retourne son Future."""
+    global loop
+    if loop is None:
+        import atexit
+        import threading
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+        atexit.register(shutdown_async)
+    return asyncio.run_coroutine_threadsafe(coro, loop)
+
+def shutdown_async():
+    """Ferme la session HTTP partagée puis arrête la boucle persistante."""
+    from discord_api import DiscordAPI
+    try:
+        submit_async(DiscordAPI.close_shared_session()).result(timeout=5)
+    except Exception as e:
+        logger.warning(f"Fermeture de la session Discord impossible: {str(e)}")
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+
+def run_async(coro):
+    """Exécute une coroutine sur la boucle persistante et attend son résultat."""
+    return submit_async(coro).result()
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
     if request.method == 'POST':
@@ -33,9 +59,12 @@ def index():
             flash('Les IDs des serveurs source et cible doivent être différents.', 'danger')
             return redirect(url_for('index'))
         
-        # Version Vercel - Test rapide seulement (limitation 10 secondes)
+        # Version Vercel - Test rapide seulement (limitation 10 secondes).
+        # La copie complète n'est pas lancée en tâche de fond : une fonction serverless
+        # peut être gelée dès la réponse envoyée, et interrompre la copie après le
+        # nettoyage du serveur cible. Il faudrait une file d'attente externe et un worker.
         try:
-            result = asyncio.run(asyncio.wait_for(
+            result = run_async(asyncio.wait_for(
                 validate_servers_quick(token, source_server_id, target_server_id),
                 timeout=8  # 8 secondes max pour Vercel
             ))
@@ -65,7 +94,9 @@ def index():
 
 async def validate_servers_quick(token, source_server_id, target_server_id):
     """Validation rapide pour Vercel (< 8 secondes)"""
-    discord_api = DiscordAPI(token)
+    # Import différé : aiohttp n'est chargé que lorsqu'on contacte Discord
+    from discord_api import DiscordAPI
+    discord_api = DiscordAPI.for_token(token)
     
     try:
         # Test rapide des serveurs uniquement
@@ -77,8 +108,6 @@ async def validate_servers_quick(token, source_server_id, target_server_id):
         if not target_server:
             return {'success': False, 'message': f'Serveur cible inaccessible (ID: {target_server_id})'}
         
-        await discord_api.close()
-        
         return {
             'success': True,
             'source_name': source_server.get('name', 'Unknown'),
@@ -86,8 +115,10 @@ async def validate_servers_quick(token, source_server_id, target_server_id):
         }
     
     except Exception as e:
-        await discord_api.close()
         return {'success': False, 'message': str(e)}
+    
+    finally:
+        DiscordAPI.release_token(token)
 
 async def copy_server(token, source_server_id, target_server_id):
     """
@@ -101,51 +132,39 @@ async def copy_server(token, source_server_id, target_server_id):
     Returns:
         Tuple (success, message): Un booléen indiquant si la copie a réussi et un message
     """
-    discord_api = DiscordAPI(token)
+    from discord_api import DiscordAPI
+    discord_api = DiscordAPI.for_token(token)
     
     try:
         # Étape 1: Vérifier que les serveurs source et cible existent
-        logger.info(f"Vérification du serveur source ID: {source_server_id}")
+        logger.info("Vérification du serveur source ID: %s", source_server_id)
         source_server = await discord_api.get_server(source_server_id)
         if not source_server:
             return False, f"Impossible d'accéder au serveur source (ID: {source_server_id}). Vérifiez l'ID et vos permissions."
         
-        logger.info(f"Vérification du serveur cible ID: {target_server_id}")
+        logger.info("Vérification du serveur cible ID: %s", target_server_id)
         target_server = await discord_api.get_server(target_server_id)
         if not target_server:
             return False, f"Impossible d'accéder au serveur cible (ID: {target_server_id}). Vérifiez l'ID et vos permissions."
         
         # Étape 2: Extraire les données du serveur source
         source_name = source_server.get('name', 'Unknown')
-        logger.info(f"Extraction des données du serveur source: {source_name}")
-        
-        logger.info("Récupération des canaux...")
-        channels = await discord_api.get_channels(source_server_id)
-        # Ajout d'une pause pour éviter les rate limits
-        await asyncio.sleep(1)
-        
-        logger.info("Récupération des rôles...")
-        roles = await discord_api.get_roles(source_server_id)
-        await asyncio.sleep(1)
-        
-        logger.info("Récupération des emojis...")
-        emojis = await discord_api.get_emojis(source_server_id)
-        await asyncio.sleep(1)
+        logger.info("Extraction des données du serveur source: %s", source_name)
         
-        logger.info("Récupération des stickers...")
-        stickers = await discord_api.get_stickers(source_server_id)
-        await asyncio.sleep(1)
+        # Les quatre requêtes sont indépendantes : on les lance en parallèle,
+        # le client Discord se charge de limiter la concurrence et les rate limits
+        logger.info("Récupération des canaux, rôles, emojis et stickers...")
+        channels, roles, emojis, stickers = await discord_api.fetch_source_bundle(source_server_id)
         
         # Étape 3: Nettoyer le serveur cible
         target_name = target_server.get('name', 'Unknown')
-        logger.info(f"Nettoyage du serveur cible: {target_name}")
+        logger.info("Nettoyage du serveur cible: %s", target_name)
         
         # Ajoutons un bloc try/except spécifique pour le nettoyage du serveur
         try:
             await discord_api.clear_server(target_server_id)
-            await asyncio.sleep(2)  # Pause plus longue après le nettoyage
         except Exception as e:
-            logger.error(f"Erreur lors du nettoyage du serveur: {str(e)}")
+            logger.error("Erreur lors du nettoyage du serveur: %s", e)
             return False, f"Erreur lors du nettoyage du serveur cible: {str(e)}"
         
         # Étape 4: Restaurer la structure du serveur cible
@@ -169,17 +188,16 @@ async def copy_server(token, source_server_id, target_server_id):
         if stickers:
             await discord_api.restore_stickers(target_server_id, stickers)
         
-        logger.info(f"Copie terminée avec succès ! Le serveur '{source_name}' a été copié vers '{target_name}'.")
+        logger.info("Copie terminée avec succès ! Le serveur '%s' a été copié vers '%s'.", source_name, target_name)
         
         return True, f"Le serveur '{source_name}' a été copié avec succès vers '{target_name}'!"
         
     except Exception as e:
-        logger.error(f"Erreur générale pendant la copie: {str(e)}")
+        logger.error("Erreur générale pendant la copie: %s", e)
         return False, f"Une erreur s'est produite: {str(e)}"
     
     finally:
-        # Fermer la session aiohttp
-        await discord_api.close()
+        DiscordAPI.release_token(token)
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -5,12 +5,13 @@ A utility for backing up and restoring Discord server structures using Discord t
 """
 
 import argparse
+import asyncio
 import logging
 import os
 import sys
 from pathlib import Path
 
-from backup_utils import create_backup_directory, save_backup, load_backup
+from backup_utils import BACKUP_SUFFIXES, create_backup_directory, save_backup, stream_backup, load_backup
 from discord_api import DiscordAPI
 
 # Configure logging
@@ -18,8 +19,12 @@ logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def parse_arguments():
-    """Parse command line arguments."""
+# Defaults resolved once at startup
+DEFAULT_BACKUP_DIR = Path('./backups').resolve()
+DEFAULT_TOKEN = os.environ.get('DISCORD_TOKEN')
+
+def _build_parser():
+    """Build the command line argument parser."""
     parser = argparse.ArgumentParser(description='Discord Server Backup Tool')
     
     # Token argument
@@ -32,6 +37,8 @@ def parse_arguments():
     backup_parser = subparsers.add_parser('backup', help='Backup a Discord server')
     backup_parser.add_argument('--server-id', type=str, required=True, help='ID of the server to backup')
     backup_parser.add_argument('--output', type=str, help='Output directory for backup (default: ./backups)')
+    backup_parser.add_argument('--pretty', action='store_true', help='Write an indented, human-readable backup file')
+    backup_parser.add_argument('--compress', action='store_true', help='Compress the backup file with zstd (.zst)')
     
     # Restore command
     restore_parser = subparsers.add_parser('restore', help='Restore a Discord server from backup')
@@ -42,9 +49,16 @@ def parse_arguments():
     list_parser = subparsers.add_parser('list', help='List available backups')
     list_parser.add_argument('--directory', type=str, help='Directory containing backups (default: ./backups)')
     
-    return parser.parse_args()
+    return parser
 
-async def backup_server(api, server_id, output_dir):
+# The parser does not depend on the input, so it is built once at import
+_PARSER = _build_parser()
+
+def parse_arguments():
+    """Parse command line arguments."""
+    return _PARSER.parse_args()
+
+async def backup_server(api, server_id, output_dir, pretty=False, compress=False):
     """Backup a Discord server."""
     try:
         logger.info(f"Starting backup of server ID: {server_id}")
@@ -58,26 +72,49 @@ async def backup_server(api, server_id, output_dir):
             logger.error(f"Server with ID {server_id} not found or you don't have access.")
             return False
         
-        logger.info(f"Backing up server: {server.get('name', 'Unknown')}")
-        
-        # Get server components
-        channels = await api.get_channels(server_id)
-        roles = await api.get_roles(server_id)
-        emojis = await api.get_emojis(server_id)
-        stickers = await api.get_stickers(server_id)
-        
-        # Build backup data
-        backup_data = {
-            'server': server,
-            'channels': channels,
-            'roles': roles,
-            'emojis': emojis,
-            'stickers': stickers
-        }
-        
-        # Save backup
-        backup_filename = f"{server.get('name', server_id)}-{server_id}.json"
-        backup_path = save_backup(backup_data, backup_dir, backup_filename)
+        server_name = server.get('name')
+        logger.info(f"Backing up server: {server_name or 'Unknown'}")
+        
+        backup_filename = f"{server_name or server_id}-{server_id}.json"
+        
+        if pretty:
+            # Get server components
+            channels, roles, emojis, stickers = await api.fetch_source_bundle(server_id)
+            
+            # Build backup data
+            backup_data = {
+                'server': server,
+                'channels': channels,
+                'roles': roles,
+                'emojis': emojis,
+                'stickers': stickers
+            }
+            
+            # Save backup
+            backup_path = save_backup(backup_data, backup_dir, backup_filename, pretty=True, compress=compress)
+        
+        else:
+            # Start every fetch at once and write each component as soon as it
+            # arrives, without building the aggregate backup dict
+            fetches = [
+                (key, asyncio.ensure_future(fetch(server_id)))
+                for key, fetch in (
+                    ('channels', api.get_channels),
+                    ('roles', api.get_roles),
+                    ('emojis', api.get_emojis),
+                    ('stickers', api.get_stickers)
+                )
+            ]
+            
+            async def components():
+                yield 'server', server
+                for key, fetch in fetches:
+                    yield key, await fetch
+            
+            backup_path = await stream_backup(components(), backup_dir, backup_filename, compress=compress)
+        
+        if not backup_path:
+            return False
         
         logger.info(f"Backup completed successfully and saved to: {backup_path}")
         return True
@@ -134,28 +171,30 @@ async def restore_server(api, backup_file, target_server_id):
 
 def list_backups(directory):
     """List available backups."""
-    backup_dir = Path(directory or './backups')
+    backup_dir = Path(directory) if directory else DEFAULT_BACKUP_DIR
     
     if not backup_dir.exists():
         logger.info(f"Backup directory {backup_dir} does not exist.")
         return
     
-    backup_files = list(backup_dir.glob('*.json'))
+    # os.scandir yields names and file types without building a Path per entry
+    with os.scandir(backup_dir) as entries:
+        backup_files = [entry.name for entry in entries if entry.name.endswith(BACKUP_SUFFIXES) and entry.is_file()]
     
     if not backup_files:
         logger.info(f"No backup files found in {backup_dir}.")
         return
     
     logger.info(f"Found {len(backup_files)} backup files:")
-    for file in backup_files:
-        logger.info(f"- {file.name}")
+    for name in backup_files:
+        logger.info(f"- {name}")
 
 async def main():
     """Main entry point for the application."""
     args = parse_arguments()
     
     # Get token from arguments or environment variable
-    token = args.token or os.environ.get('DISCORD_TOKEN')
+    token = args.token or DEFAULT_TOKEN
     if not token:
         logger.error("Discord token not provided. Use --token or set DISCORD_TOKEN environment variable.")
         sys.exit(1)
@@ -164,8 +203,8 @@ async def main():
     discord_api = DiscordAPI(token)
     
     if args.command == 'backup':
-        output_dir = args.output or './backups'
-        success = await backup_server(discord_api, args.server_id, output_dir)
+        output_dir = args.output or DEFAULT_BACKUP_DIR
+        success = await backup_server(discord_api, args.server_id, output_dir, args.pretty, args.compress)
         if not success:
             sys.exit(1)
     
@@ -182,5 +221,4 @@ async def main():
         sys.exit(1)
 
 if __name__ == '__main__':
-    import asyncio
     asyncio.run(main())
@@ -3,131 +3,362 @@ Discord API Client
 A module to interact with the Discord API for server backup and restoration operations.
 """
 
-import aiohttp
 import asyncio
+import contextlib
 import logging
+import orjson
+import random
 import time
-import json
-from typing import Dict, List, Optional, Any, Tuple, Union, cast
+from typing import TYPE_CHECKING, Dict, List, Optional, Any, Tuple, Union
+
+# aiohttp is only imported once a session is needed, to keep imports cheap
+# for code paths that never talk to Discord
+if TYPE_CHECKING:
+    import aiohttp
 
 logger = logging.getLogger(__name__)
 
 class RateLimitHandler:
-    """Handler for Discord API rate limits."""
+    """Handler for Discord API rate limits, driven by the rate limit response headers."""
     
     def __init__(self):
-        self.reset_after = 0
-        self.limit_remaining = None
-        self.global_limit = False
-        self.last_request_time = 0
+        # Route key -> Discord bucket id, learned from X-RateLimit-Bucket
+        self._route_buckets: Dict[str, str] = {}
+        # Bucket id -> {'limit', 'remaining', 'reset_at', 'window'}
+        self._buckets: Dict[str, Dict[str, float]] = {}
+        # Route key -> event set once the request probing an unknown route completes
+        self._discovering: Dict[str, asyncio.Event] = {}
+        self._lock = asyncio.Lock()
+        # Cleared while a global 429 is being waited out so that every request backs off
+        self._open = asyncio.Event()
+        self._open.set()
+        self._blocked_until = 0.0
     
-    def update_from_headers(self, headers):
-        """Update rate limit information from response headers."""
-        if 'X-RateLimit-Remaining' in headers:
-            self.limit_remaining = int(headers['X-RateLimit-Remaining'])
-            
-        if 'X-RateLimit-Reset-After' in headers:
-            self.reset_after = float(headers['X-RateLimit-Reset-After'])
-            
-        if 'X-RateLimit-Global' in headers:
-            self.global_limit = headers['X-RateLimit-Global'].lower() == 'true'
+    @staticmethod
+    def route_key(method: str, endpoint: str) -> str:
+        """Get the key identifying the rate limit route of a request."""
+        # The major parameter (e.g. /guilds/{id}) is part of the route, other ids are not
+        parts = endpoint.split('/')
+        minor = ['{id}' if part.isdigit() else part for part in parts[3:]]
+        return f"{method} {'/'.join(parts[:3] + minor)}"
     
-    async def handle_rate_limit(self):
-        """Handle rate limiting by waiting if necessary."""
-        # Always add a small delay between requests to avoid hitting rate limits
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
+    def update_from_headers(self, route: str, headers):
+        """Update rate limit information from response headers."""
+        bucket_id = headers.get('X-RateLimit-Bucket')
+        if bucket_id is None or 'X-RateLimit-Remaining' not in headers:
+            return
         
-        # Default delay between requests to prevent rate limits (600ms)
-        min_delay = 0.6
+        remaining = int(headers['X-RateLimit-Remaining'])
+        reset_after = float(headers.get('X-RateLimit-Reset-After', 0))
+        reset_at = time.monotonic() + reset_after
         
-        if time_since_last < min_delay:
-            await asyncio.sleep(min_delay - time_since_last)
+        # Requests reserved in the same window may not have been counted by Discord yet
+        bucket = self._buckets.get(bucket_id)
+        if bucket is not None and abs(reset_at - bucket['reset_at']) < 1.0:
+            remaining = min(remaining, bucket['remaining'])
         
-        # Handle explicit rate limits
-        if self.limit_remaining is not None and self.limit_remaining <= 1:
-            wait_time = self.reset_after + 1.0  # Add a larger buffer
-            logger.warning(f"Rate limit hit, waiting for {wait_time} seconds")
-            await asyncio.sleep(wait_time)
-            self.limit_remaining = None
-            self.reset_after = 0
+        # Reset-After is the time left in the current window, not its length:
+        # the longest one seen is the closest to the real window length
+        window = reset_after if bucket is None else max(bucket['window'], reset_after)
+        
+        self._route_buckets[route] = bucket_id
+        self._buckets[bucket_id] = {
+            'limit': int(headers.get('X-RateLimit-Limit', remaining + 1)),
+            'remaining': remaining,
+            'reset_at': reset_at,
+            'window': window
+        }
+    
+    async def block(self, wait_time):
+        """Hold back all requests until a global rate limit has expired."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + wait_time)
+        self._open.clear()
+        # Reopened by a timer rather than by this task, so that cancelling the
+        # request that hit the limit cannot leave every other request blocked
+        asyncio.get_running_loop().call_later(wait_time, self._reopen)
+        await self.wait_until_open()
+    
+    def _reopen(self):
+        """Reopen the gate once the longest pending global rate limit is over."""
+        remaining = self._blocked_until - time.monotonic()
+        if remaining > 0:
+            asyncio.get_running_loop().call_later(remaining, self._reopen)
+        else:
+            self._open.set()
+    
+    async def wait_until_open(self):
+        """Wait until no global rate limit is blocking requests."""
+        await self._open.wait()
+    
+    async def acquire(self, route: str):
+        """Wait until the bucket of a route has quota left, and reserve one request."""
+        while True:
+            await self.wait_until_open()
+            
+            async with self._lock:
+                bucket = self._buckets.get(self._route_buckets.get(route))
+                
+                if bucket is None:
+                    # Unknown bucket: a single request goes out to learn its limits,
+                    # the others wait for it to complete
+                    discovery = self._discovering.get(route)
+                    if discovery is None:
+                        self._discovering[route] = asyncio.Event()
+                        return
+                    wait_time = None
+                
+                else:
+                    now = time.monotonic()
+                    if bucket['reset_at'] <= now:
+                        # The window has been reset: assume a full quota until the next response
+                        bucket['remaining'] = bucket['limit']
+                        bucket['reset_at'] = now + bucket['window']
+                    
+                    if bucket['remaining'] > 0:
+                        bucket['remaining'] -= 1
+                        return
+                    
+                    wait_time = bucket['reset_at'] - now
+            
+            # Wait outside of the lock so that other buckets are not held up
+            if wait_time is None:
+                await discovery.wait()
+                continue
             
-        # Update the last request time
-        self.last_request_time = time.time()
+            logger.debug(f"Rate limit bucket exhausted for {route}, waiting for {wait_time:.2f} seconds")
+            await asyncio.sleep(wait_time)
+    
+    def release(self, route: str):
+        """Mark a request as completed, waking up requests waiting for the limits of its route."""
+        discovery = self._discovering.pop(route, None)
+        if discovery is not None:
+            discovery.set()
 
 class DiscordAPI:
     """Discord API client for server backup and restoration."""
     
     API_BASE_URL = "https://discord.com/api/v10"
     
+    # Maximum number of in-flight requests per guild
+    MAX_CONCURRENT_REQUESTS = 5
+    
+    # Number of create/delete requests run concurrently during bulk operations
+    BULK_CONCURRENCY = 5
+    
+    # Exponential backoff with full jitter between retries of failed requests
+    BACKOFF_BASE = 0.5
+    BACKOFF_CAP = 30.0
+    
+    # Connection pool of the shared session: bursts of concurrent requests are
+    # spread over a few kept-alive TLS connections instead of opening new ones
+    MAX_CONNECTIONS_PER_HOST = 10
+    KEEPALIVE_TIMEOUT = 60
+    
+    # How long resolved DNS entries are cached by the shared session (seconds)
+    DNS_CACHE_TTL = 300
+    
+    # How long cached GET responses (server, roles, channels) are reused before
+    # being revalidated with their ETag (seconds)
+    CACHE_TTL = 60
+    
+    # HTTP session shared by all clients, and the event loop it is bound to.
+    # Reusing it keeps connections alive between clients and tokens.
+    _shared_session: Optional["aiohttp.ClientSession"] = None
+    _shared_session_loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    # Clients of the tokens in use, so that concurrent operations on the same
+    # token share one rate limiter and response cache. A client (and its token)
+    # is dropped as soon as the last operation using it releases it.
+    _pool: Dict[str, "DiscordAPI"] = {}
+    
     def __init__(self, token):
+        import aiohttp
+        
         self.token = token
         self.rate_limit = RateLimitHandler()
         self.session = None
+        # Number of operations that checked this client out with for_token
+        self._users = 0
+        self._bucket_semaphores: Dict[str, asyncio.Semaphore] = {}
+        # Endpoint -> (expires_at, ETag, data) of cached GET responses
+        self._cache: Dict[str, Tuple[float, Optional[str], Any]] = {}
+        
+        # Per-request constants, built once rather than on every call. The token
+        # is sent per request since the session is shared between tokens; as a
+        # multidict, aiohttp merges it without converting it on every request.
+        from multidict import CIMultiDict, CIMultiDictProxy
+        self._headers = CIMultiDictProxy(CIMultiDict(Authorization=token))
+        # Set a reasonable timeout for each request to prevent worker timeouts
+        self._timeout = aiohttp.ClientTimeout(total=10)
     
-    async def _ensure_session(self):
-        """Ensure that an HTTP session exists."""
-        if self.session is None:
-            self.session = aiohttp.ClientSession(headers={
-                "Authorization": self.token,
+    @classmethod
+    def for_token(cls, token: str) -> "DiscordAPI":
+        """
+        Check out the shared client of a token, creating it if needed.
+        
+        Every call must be matched by a release_token() call once the operation is over.
+        """
+        client = cls._pool.get(token)
+        if client is None:
+            client = cls._pool[token] = cls(token)
+        client._users += 1
+        return client
+    
+    @classmethod
+    def release_token(cls, token: str):
+        """Release a client checked out with for_token, dropping it once no operation uses it."""
+        client = cls._pool.get(token)
+        if client is None:
+            return
+        
+        client._users -= 1
+        if client._users <= 0:
+            del cls._pool[token]
+    
+    @classmethod
+    def _get_shared_session(cls) -> "aiohttp.ClientSession":
+        """Get the HTTP session shared by all clients on the running event loop."""
+        import aiohttp
+        
+        loop = asyncio.get_running_loop()
+        session = cls._shared_session
+        if session is None or session.closed or cls._shared_session_loop is not loop:
+            # The Authorization header is sent per request so that a single
+            # session can serve every token
+            # aiodns resolves on the event loop instead of in a thread pool
+            connector = aiohttp.TCPConnector(
+                limit_per_host=cls.MAX_CONNECTIONS_PER_HOST,
+                keepalive_timeout=cls.KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=cls.DNS_CACHE_TTL,
+                resolver=aiohttp.AsyncResolver(),
+                enable_cleanup_closed=True
+            )
+            session = aiohttp.ClientSession(connector=connector, headers={
                 "Content-Type": "application/json",
                 "User-Agent": "DiscordBackupTool/1.0"
             })
+            cls._shared_session = session
+            cls._shared_session_loop = loop
+        return session
+    
+    @classmethod
+    async def close_shared_session(cls):
+        """Close the HTTP session shared by all clients."""
+        if cls._shared_session:
+            await cls._shared_session.close()
+            cls._shared_session = None
+            cls._shared_session_loop = None
+    
+    async def _ensure_session(self):
+        """Ensure that an HTTP session exists."""
+        self.session = self._get_shared_session()
+    
+    def _bucket_semaphore(self, endpoint: str):
+        """Get the semaphore limiting concurrent requests for an endpoint's guild."""
+        # Only guild-scoped requests are capped here: a client only touches a few
+        # guilds, whereas one semaphore per channel would pile up for good. Other
+        # routes (e.g. /channels/{id}) are paced by the rate limit headers alone.
+        parts = endpoint.split('/')
+        if parts[1] != 'guilds':
+            return contextlib.nullcontext()
+        
+        bucket = '/'.join(parts[:3])
+        semaphore = self._bucket_semaphores.get(bucket)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_REQUESTS)
+            self._bucket_semaphores[bucket] = semaphore
+        return semaphore
+    
+    def _backoff_delay(self, retry_count: int) -> float:
+        """Get a random delay before retrying, growing exponentially with the retry count."""
+        return random.uniform(0, min(self.BACKOFF_CAP, self.BACKOFF_BASE * (2 ** retry_count)))
+    
+    async def _gather_bounded(self, coros) -> List[Any]:
+        """Run coroutines concurrently, at most BULK_CONCURRENCY at a time."""
+        semaphore = asyncio.Semaphore(self.BULK_CONCURRENCY)
+        
+        async def run(coro):
+            async with semaphore:
+                return await coro
+        
+        return await asyncio.gather(*(run(coro) for coro in coros))
+    
+    def _invalidate_cache(self, server_id: str):
+        """Drop the cached responses of a server after it has been modified."""
+        prefix = f"/guilds/{server_id}"
+        for endpoint in [e for e in self._cache if e == prefix or e.startswith(prefix + '/')]:
+            del self._cache[endpoint]
     
     async def close(self):
-        """Close the HTTP session."""
-        if self.session:
-            await self.session.close()
-            self.session = None
+        """Release the HTTP session (the shared session itself stays open for other clients)."""
+        self.session = None
     
-    async def _request(self, method, endpoint, **kwargs) -> Optional[Union[Dict, List]]:
+    async def _request(self, method, endpoint, cache: bool = False, **kwargs) -> Optional[Union[Dict, List]]:
         """Make a request to the Discord API with rate limit handling."""
+        import aiohttp
+        
+        # Serve cached GETs while they are fresh, revalidate them once expired
+        cached = self._cache.get(endpoint) if cache else None
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[2]
+        
         await self._ensure_session()
+        session = self.session
         url = f"{self.API_BASE_URL}{endpoint}"
+        bucket_semaphore = self._bucket_semaphore(endpoint)
+        route = self.rate_limit.route_key(method, endpoint)
         
-        # Handle rate limits before making the request
-        await self.rate_limit.handle_rate_limit()
+        # Encode JSON bodies with orjson straight to bytes (the session already
+        # sends Content-Type: application/json)
+        if 'json' in kwargs:
+            kwargs['data'] = orjson.dumps(kwargs.pop('json'))
+        
+        headers = self._headers
+        if cached is not None and cached[1]:
+            headers = {**headers, "If-None-Match": cached[1]}
+        timeout = self._timeout
         
         max_retries = 5
         retry_count = 0
         
         while retry_count < max_retries:
-            # Vérifier que la session est toujours valide
-            if self.session is None:
-                await self._ensure_session()
-                
+            # Wait for quota on the route's bucket (and for any global 429 to expire)
+            await self.rate_limit.acquire(route)
+            
             try:
-                # Set a reasonable timeout for each request to prevent worker timeouts
-                timeout = aiohttp.ClientTimeout(total=10)
-                
-                # Ensure we have a valid session (type checking fix)
-                session = self.session
-                if session is None:
-                    await self._ensure_session()
-                    session = cast(aiohttp.ClientSession, self.session)
-                
-                async with session.request(method, url, timeout=timeout, **kwargs) as response:
+                # Limit concurrent requests on the same bucket so gathered calls don't burst
+                async with bucket_semaphore, session.request(method, url, headers=headers, timeout=timeout, **kwargs) as response:
                     # Update rate limit information
-                    self.rate_limit.update_from_headers(response.headers)
+                    self.rate_limit.update_from_headers(route, response.headers)
                     
                     # Handle different response statuses
                     if response.status == 429:  # Rate limited
                         retry_after = 1
+                        # Only this response says whether the limit is global
+                        is_global = response.headers.get('X-RateLimit-Global', '').lower() == 'true'
                         try:
-                            json_response = await response.json()
+                            json_response = orjson.loads(await response.read())
                             if 'retry_after' in json_response:
                                 retry_after = json_response['retry_after']
+                            is_global = is_global or json_response.get('global', False)
                         except:
                             # If we can't decode JSON, use a default wait time
                             retry_after = 2
                         
-                        # Add a bit of extra time to avoid hitting rate limits again
-                        wait_time = retry_after + 1.0
-                        logger.warning(f"Rate limited. Waiting for {wait_time} seconds.")
-                        await asyncio.sleep(wait_time)
+                        # Discord tells us exactly how long to wait, so no jitter here.
+                        # Only a global limit holds back requests on other buckets.
+                        logger.warning(f"Rate limited. Waiting for {retry_after} seconds.")
+                        if is_global:
+                            await self.rate_limit.block(retry_after)
+                        else:
+                            await asyncio.sleep(retry_after)
                         retry_count += 1
                         continue
                     
+                    if response.status == 304 and cached is not None:  # Not Modified
+                        self._cache[endpoint] = (time.monotonic() + self.CACHE_TTL, cached[1], cached[2])
+                        return cached[2]
+                    
                     if response.status == 403:
                         logger.error(f"Permission denied for {endpoint}. Check your token and permissions.")
                         return None
@@ -138,13 +369,17 @@ class DiscordAPI:
                     
                     if 200 <= response.status < 300:
                         # Success - return JSON or empty dict if no content
+                        result = {}
                         if response.status != 204:  # 204 = No Content
                             try:
-                                return await response.json()
+                                result = orjson.loads(await response.read())
                             except:
                                 # Return empty dict if no valid JSON
-                                return {}
-                        return {}
+                                result = {}
+                        
+                        if cache:
+                            self._cache[endpoint] = (time.monotonic() + self.CACHE_TTL, response.headers.get('ETag'), result)
+                        return result
                     
                     # Other error
                     try:
@@ -153,41 +388,44 @@ class DiscordAPI:
                     except:
                         logger.error(f"API request failed with status {response.status} (could not read response)")
                     
-                    # Increase retry interval for server errors
+                    # Back off before retrying server errors
                     if response.status >= 500:
-                        await asyncio.sleep(2 * (retry_count + 1))
+                        await asyncio.sleep(self._backoff_delay(retry_count))
                     
                     retry_count += 1
                     continue
                     
             except aiohttp.ClientError as e:
                 logger.error(f"HTTP error during API request: {str(e)}")
+                await asyncio.sleep(self._backoff_delay(retry_count))
                 retry_count += 1
-                await asyncio.sleep(1.5 * (retry_count + 1))
             
             except asyncio.TimeoutError:
                 logger.error("API request timed out")
+                await asyncio.sleep(self._backoff_delay(retry_count))
                 retry_count += 1
-                await asyncio.sleep(1.5 * (retry_count + 1))
             
             except Exception as e:
                 logger.error(f"Unexpected error during API request: {str(e)}")
+                await asyncio.sleep(self._backoff_delay(retry_count))
                 retry_count += 1
-                await asyncio.sleep(2)
+            
+            finally:
+                self.rate_limit.release(route)
         
         logger.error(f"Failed after {max_retries} retries")
         return None
     
     async def get_server(self, server_id: str) -> Optional[Dict]:
         """Get information about a server."""
-        result = await self._request("GET", f"/guilds/{server_id}")
+        result = await self._request("GET", f"/guilds/{server_id}", cache=True)
         if isinstance(result, dict):
             return result
         return None
     
     async def get_channels(self, server_id: str) -> List[Dict]:
         """Get all channels in a server."""
-        channels = await self._request("GET", f"/guilds/{server_id}/channels")
+        channels = await self._request("GET", f"/guilds/{server_id}/channels", cache=True)
         if channels is None:
             return []
         if isinstance(channels, list):
@@ -196,7 +434,7 @@ class DiscordAPI:
     
     async def get_roles(self, server_id: str) -> List[Dict]:
         """Get all roles in a server."""
-        roles = await self._request("GET", f"/guilds/{server_id}/roles")
+        roles = await self._request("GET", f"/guilds/{server_id}/roles", cache=True)
         if roles is None:
             return []
         if isinstance(roles, list):
@@ -221,187 +459,263 @@ class DiscordAPI:
             return stickers
         return []
     
+    async def fetch_source_bundle(self, server_id: str) -> Tuple[List[Dict], List[Dict], List[Dict], List[Dict]]:
+        """
+        Fetch the channels, roles, emojis and stickers of a server concurrently.
+        
+        Args:
+            server_id: ID of the server to read
+            
+        Returns:
+            Tuple (channels, roles, emojis, stickers)
+        """
+        # Independent endpoints: throttling is left to the connector and rate limiter
+        channels, roles, emojis, stickers = await asyncio.gather(
+            self.get_channels(server_id),
+            self.get_roles(server_id),
+            self.get_emojis(server_id),
+            self.get_stickers(server_id)
+        )
+        return channels, roles, emojis, stickers
+    
     async def clear_server(self, server_id: str) -> bool:
         """Clear existing channels and roles from a server."""
+        # Work from the current state of the server, not from cached responses
+        self._invalidate_cache(server_id)
+        
         try:
             # Get existing channels
             channels = await self.get_channels(server_id)
             
             # Delete channels (except system channels which cannot be deleted)
-            for channel in channels:
-                if not channel.get('type') == 4:  # Type 4 is category
-                    await self._request("DELETE", f"/channels/{channel['id']}")
+            await self._gather_bounded(
+                self._request("DELETE", f"/channels/{channel['id']}")
+                for channel in channels
+                if channel.get('type') != 4  # Type 4 is category
+            )
             
             # Delete categories after their child channels
-            for channel in channels:
-                if channel.get('type') == 4:  # Type 4 is category
-                    await self._request("DELETE", f"/channels/{channel['id']}")
+            await self._gather_bounded(
+                self._request("DELETE", f"/channels/{channel['id']}")
+                for channel in channels
+                if channel.get('type') == 4  # Type 4 is category
+            )
             
             # Get existing roles
             roles = await self.get_roles(server_id)
             
             # Delete roles (except @everyone which cannot be deleted)
-            for role in roles:
-                if role['name'] != '@everyone':
-                    await self._request("DELETE", f"/guilds/{server_id}/roles/{role['id']}")
+            await self._gather_bounded(
+                self._request("DELETE", f"/guilds/{server_id}/roles/{role['id']}")
+                for role in roles
+                if role['name'] != '@everyone'
+            )
             
             return True
         except Exception as e:
             logger.error(f"Error clearing server: {str(e)}")
             return False
+        finally:
+            self._invalidate_cache(server_id)
+    
+    async def _create_role(self, server_id: str, role: Dict) -> Optional[str]:
+        """Create a single role and return its new ID."""
+        # Prepare role data for creation
+        role_data = {
+            'name': role['name'],
+            'permissions': role['permissions'],
+            'color': role.get('color', 0),
+            'hoist': role.get('hoist', False),
+            'mentionable': role.get('mentionable', False)
+        }
+        
+        # Create the role
+        new_role = await self._request("POST", f"/guilds/{server_id}/roles", json=role_data)
+        
+        if new_role and isinstance(new_role, dict):
+            logger.info(f"Created role: {role['name']}")
+            return new_role['id']
+        
+        logger.warning(f"Failed to create role: {role['name']}")
+        return None
     
     async def restore_roles(self, server_id: str, roles: List[Dict]) -> Dict[str, str]:
         """Restore roles to a server and return a mapping of old role IDs to new role IDs."""
         role_id_map = {}
         
-        # Sort roles by position to ensure proper hierarchy
-        sorted_roles = sorted(roles, key=lambda r: r.get('position', 0))
+        # Look up the target's @everyone role once, before creating anything
+        target_roles = await self.get_roles(server_id)
+        everyone_id = next((r['id'] for r in target_roles if r['name'] == '@everyone'), None)
         
-        for role in sorted_roles:
-            # Skip @everyone role as it already exists
+        # Sort roles by position to ensure proper hierarchy
+        sorted_roles = []
+        for role in sorted(roles, key=lambda r: r.get('position', 0)):
+            # Skip @everyone role as it already exists, but still add it to the ID map
             if role['name'] == '@everyone':
-                # Still add it to the ID map
-                everyone_role = [r for r in await self.get_roles(server_id) if r['name'] == '@everyone'][0]
-                role_id_map[role['id']] = everyone_role['id']
-                continue
-            
-            # Prepare role data for creation
-            role_data = {
-                'name': role['name'],
-                'permissions': role['permissions'],
-                'color': role.get('color', 0),
-                'hoist': role.get('hoist', False),
-                'mentionable': role.get('mentionable', False)
-            }
-            
-            # Create the role
-            new_role = await self._request("POST", f"/guilds/{server_id}/roles", json=role_data)
-            
-            if new_role and isinstance(new_role, dict):
-                role_id_map[role['id']] = new_role['id']
-                logger.info(f"Created role: {role['name']}")
+                if everyone_id:
+                    role_id_map[role['id']] = everyone_id
             else:
-                logger.warning(f"Failed to create role: {role['name']}")
+                sorted_roles.append(role)
+        
+        # Create every role concurrently, then restore the hierarchy with a
+        # single bulk position update instead of creating roles level by level
+        new_ids = await self._gather_bounded(self._create_role(server_id, role) for role in sorted_roles)
+        
+        positions = []
+        for role, new_id in zip(sorted_roles, new_ids):
+            if new_id:
+                role_id_map[role['id']] = new_id
+                positions.append({'id': new_id, 'position': role.get('position', 0)})
         
+        if positions:
+            await self._request("PATCH", f"/guilds/{server_id}/roles", json=positions)
+        
+        self._invalidate_cache(server_id)
         return role_id_map
     
+    @staticmethod
+    def _map_permission_overwrites(overwrites: List[Dict], role_id_map: Dict[str, str]) -> List[Dict]:
+        """Prepare permission overwrites with mapped role IDs."""
+        get_role_id = role_id_map.get
+        return [
+            overwrite if overwrite['type'] == 1 else {  # Type 1 is member, keep as is
+                'id': new_id,
+                'type': overwrite['type'],
+                'allow': overwrite.get('allow', '0'),
+                'deny': overwrite.get('deny', '0')
+            }
+            for overwrite in overwrites
+            if overwrite['type'] == 1
+            or (overwrite['type'] == 0 and (new_id := get_role_id(overwrite['id'])) is not None)  # Type 0 is role
+        ]
+    
+    async def _create_category(self, server_id: str, category: Dict, permission_overwrites: List[Dict]) -> Optional[str]:
+        """Create a single category and return its new ID."""
+        category_data = {
+            'name': category['name'],
+            'type': 4,
+            'permission_overwrites': permission_overwrites,
+            'position': category.get('position', 0)
+        }
+        
+        new_category = await self._request("POST", f"/guilds/{server_id}/channels", json=category_data)
+        
+        if new_category and isinstance(new_category, dict):
+            logger.info(f"Created category: {category['name']}")
+            return new_category['id']
+        
+        logger.warning(f"Failed to create category: {category['name']}")
+        return None
+    
+    async def _create_channel(self, server_id: str, channel: Dict, permission_overwrites: List[Dict],
+                              category_id_map: Dict[str, str]):
+        """Create a single text or voice channel."""
+        # Prepare channel data
+        channel_data = {
+            'name': channel['name'],
+            'type': channel['type'],
+            'permission_overwrites': permission_overwrites,
+            'topic': channel.get('topic', ''),
+            'nsfw': channel.get('nsfw', False),
+            'rate_limit_per_user': channel.get('rate_limit_per_user', 0),
+            'position': channel.get('position', 0)
+        }
+        
+        # Add parent category if applicable
+        if channel.get('parent_id') and channel['parent_id'] in category_id_map:
+            channel_data['parent_id'] = category_id_map[channel['parent_id']]
+        
+        # Add voice-specific properties if this is a voice channel
+        if channel['type'] == 2:  # Type 2 is voice channel
+            channel_data['bitrate'] = channel.get('bitrate', 64000)
+            channel_data['user_limit'] = channel.get('user_limit', 0)
+        
+        new_channel = await self._request("POST", f"/guilds/{server_id}/channels", json=channel_data)
+        
+        if new_channel:
+            logger.info(f"Created channel: {channel['name']}")
+        else:
+            logger.warning(f"Failed to create channel: {channel['name']}")
+    
     async def restore_channels(self, server_id: str, channels: List[Dict], role_id_map: Dict[str, str]):
         """Restore channels to a server."""
+        # In a single pass, split categories from other channels (so categories
+        # are created first) and remap the permission overwrites of every channel
+        categories, non_categories = [], []
+        add_category, add_channel = categories.append, non_categories.append
+        map_overwrites = self._map_permission_overwrites
+        overwrites_by_channel = {}
+        
+        for channel in channels:
+            (add_category if channel.get('type') == 4 else add_channel)(channel)  # Type 4 is category
+            overwrites_by_channel[channel['id']] = map_overwrites(channel.get('permission_overwrites', []), role_id_map)
+        
         # First create categories
         category_id_map = {}
         
-        # Sort channels to ensure categories are created first
-        categories = [c for c in channels if c.get('type') == 4]  # Type 4 is category
-        
-        for category in categories:
-            # Prepare permission overwrites with mapped role IDs
-            permission_overwrites = []
-            for overwrite in category.get('permission_overwrites', []):
-                if overwrite['type'] == 0 and overwrite['id'] in role_id_map:  # Type 0 is role
-                    permission_overwrites.append({
-                        'id': role_id_map[overwrite['id']],
-                        'type': overwrite['type'],
-                        'allow': overwrite.get('allow', '0'),
-                        'deny': overwrite.get('deny', '0')
-                    })
-                elif overwrite['type'] == 1:  # Type 1 is member, keep as is
-                    permission_overwrites.append(overwrite)
-            
-            # Create category
-            category_data = {
-                'name': category['name'],
-                'type': 4,
-                'permission_overwrites': permission_overwrites,
-                'position': category.get('position', 0)
-            }
-            
-            new_category = await self._request("POST", f"/guilds/{server_id}/channels", json=category_data)
-            
-            if new_category and isinstance(new_category, dict):
-                category_id_map[category['id']] = new_category['id']
-                logger.info(f"Created category: {category['name']}")
-            else:
-                logger.warning(f"Failed to create category: {category['name']}")
+        # Categories must all exist before their child channels are created
+        new_ids = await self._gather_bounded(
+            self._create_category(server_id, category, overwrites_by_channel[category['id']])
+            for category in categories
+        )
+        for category, new_id in zip(categories, new_ids):
+            if new_id:
+                category_id_map[category['id']] = new_id
         
         # Then create text and voice channels
-        non_categories = [c for c in channels if c.get('type') != 4]
-        
-        for channel in non_categories:
-            # Prepare permission overwrites with mapped role IDs
-            permission_overwrites = []
-            for overwrite in channel.get('permission_overwrites', []):
-                if overwrite['type'] == 0 and overwrite['id'] in role_id_map:  # Type 0 is role
-                    permission_overwrites.append({
-                        'id': role_id_map[overwrite['id']],
-                        'type': overwrite['type'],
-                        'allow': overwrite.get('allow', '0'),
-                        'deny': overwrite.get('deny', '0')
-                    })
-                elif overwrite['type'] == 1:  # Type 1 is member, keep as is
-                    permission_overwrites.append(overwrite)
-            
-            # Prepare channel data
-            channel_data = {
-                'name': channel['name'],
-                'type': channel['type'],
-                'permission_overwrites': permission_overwrites,
-                'topic': channel.get('topic', ''),
-                'nsfw': channel.get('nsfw', False),
-                'rate_limit_per_user': channel.get('rate_limit_per_user', 0),
-                'position': channel.get('position', 0)
-            }
-            
-            # Add parent category if applicable
-            if channel.get('parent_id') and channel['parent_id'] in category_id_map:
-                channel_data['parent_id'] = category_id_map[channel['parent_id']]
-            
-            # Add voice-specific properties if this is a voice channel
-            if channel['type'] == 2:  # Type 2 is voice channel
-                channel_data['bitrate'] = channel.get('bitrate', 64000)
-                channel_data['user_limit'] = channel.get('user_limit', 0)
-            
-            new_channel = await self._request("POST", f"/guilds/{server_id}/channels", json=channel_data)
-            
-            if new_channel:
-                logger.info(f"Created channel: {channel['name']}")
-            else:
-                logger.warning(f"Failed to create channel: {channel['name']}")
+        await self._gather_bounded(
+            self._create_channel(server_id, channel, overwrites_by_channel[channel['id']], category_id_map)
+            for channel in non_categories
+        )
+        self._invalidate_cache(server_id)
+    
+    async def _create_emoji(self, server_id: str, emoji: Dict):
+        """Create a single emoji."""
+        # Emojis need to be re-uploaded as images
+        emoji_data = {
+            'name': emoji['name'],
+            'image': emoji['image'],
+            'roles': []  # We can't map roles for emojis easily
+        }
+        
+        new_emoji = await self._request("POST", f"/guilds/{server_id}/emojis", json=emoji_data)
+        
+        if new_emoji:
+            logger.info(f"Created emoji: {emoji['name']}")
+        else:
+            logger.warning(f"Failed to create emoji: {emoji['name']}")
     
     async def restore_emojis(self, server_id: str, emojis: List[Dict]):
         """Restore emojis to a server."""
-        for emoji in emojis:
-            # Emojis need to be re-uploaded as images
-            if 'image' in emoji and emoji['available']:
-                # Create emoji
-                emoji_data = {
-                    'name': emoji['name'],
-                    'image': emoji['image'],
-                    'roles': []  # We can't map roles for emojis easily
-                }
-                
-                new_emoji = await self._request("POST", f"/guilds/{server_id}/emojis", json=emoji_data)
-                
-                if new_emoji:
-                    logger.info(f"Created emoji: {emoji['name']}")
-                else:
-                    logger.warning(f"Failed to create emoji: {emoji['name']}")
+        await self._gather_bounded(
+            self._create_emoji(server_id, emoji)
+            for emoji in emojis
+            if 'image' in emoji and emoji['available']
+        )
+        self._invalidate_cache(server_id)
+    
+    async def _create_sticker(self, server_id: str, sticker: Dict):
+        """Create a single sticker."""
+        # Stickers need to be re-uploaded as images
+        sticker_data = {
+            'name': sticker['name'],
+            'description': sticker.get('description', ''),
+            'tags': sticker.get('tags', ''),
+            'file': sticker['image']
+        }
+        
+        new_sticker = await self._request("POST", f"/guilds/{server_id}/stickers", json=sticker_data)
+        
+        if new_sticker:
+            logger.info(f"Created sticker: {sticker['name']}")
+        else:
+            logger.warning(f"Failed to create sticker: {sticker['name']}")
     
     async def restore_stickers(self, server_id: str, stickers: List[Dict]):
         """Restore stickers to a server."""
-        for sticker in stickers:
-            # Stickers need to be re-uploaded as images
-            if 'image' in sticker:
-                # Create sticker
-                sticker_data = {
-                    'name': sticker['name'],
-                    'description': sticker.get('description', ''),
-                    'tags': sticker.get('tags', ''),
-                    'file': sticker['image']
-                }
-                
-                new_sticker = await self._request("POST", f"/guilds/{server_id}/stickers", json=sticker_data)
-                
-                if new_sticker:
-                    logger.info(f"Created sticker: {sticker['name']}")
-                else:
-                    logger.warning(f"Failed to create sticker: {sticker['name']}")
+        await self._gather_bounded(
+            self._create_sticker(server_id, sticker)
+            for sticker in stickers
+            if 'image' in sticker
+        )
+        self._invalidate_cache(server_id)
\ No newline at end of file
@@ -17,15 +17,72 @@ logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+class CopyBot(commands.Bot):
+    """Bot qui ferme la session HTTP partagée du client Discord à l'arrêt."""
+    
+    async def close(self):
+        try:
+            await DiscordAPI.close_shared_session()
+        finally:
+            await super().close()
+
 # Créer un bot avec les intents nécessaires
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix='!', intents=intents)
+bot = CopyBot(command_prefix='!', intents=intents)
 
 # Dictionnaire pour stocker les tokens et les travaux en cours
 user_tokens = {}
 copy_tasks = {}
 
+class Debouncer:
+    """
+    Regroupe les modifications successives d'un message Discord.
+    
+    Seul le dernier texte reçu pendant l'intervalle est envoyé, ce qui limite
+    le nombre d'appels à l'API (eux aussi soumis aux rate limits).
+    """
+    
+    def __init__(self, message, interval: float = 0.5):
+        self.message = message
+        self.interval = interval
+        self._pending: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def update(self, content: str):
+        """Planifie l'affichage d'un nouveau texte."""
+        self._pending = content
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._send_later())
+    
+    async def _send_later(self):
+        # Les textes reçus pendant un envoi en cours sont envoyés au tour suivant
+        while self._pending is not None:
+            await asyncio.sleep(self.interval)
+            content, self._pending = self._pending, None
+            if content is not None:
+                # Une mise à jour intermédiaire ratée ne doit pas interrompre la copie
+                try:
+                    await self.message.edit(content=content)
+                except Exception as e:
+                    logger.warning("Impossible de mettre à jour le message de statut: %s", e)
+    
+    async def flush(self, content: Optional[str] = None):
+        """Affiche immédiatement le dernier texte (ou celui fourni) et annule l'envoi différé."""
+        if content is not None:
+            self._pending = content
+        if self._task is not None:
+            # Attendre l'annulation : une modification en cours ne doit pas arriver après le texte final
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        
+        content, self._pending = self._pending, None
+        if content is not None:
+            await self.message.edit(content=content)
+
 @bot.event
 async def on_ready():
     """Événement déclenché lorsque le bot est prêt."""
@@ -171,6 +228,13 @@ async def check_status(ctx):
     else:
         await ctx.send("🔄 Une copie de serveur est en cours. Cela peut prendre plusieurs minutes.")
 
+async def run_optional_step(coro, error_message: str):
+    """Exécute une étape facultative de la copie : une erreur est journalisée sans interrompre la copie."""
+    try:
+        await coro
+    except Exception as e:
+        logger.error("%s: %s", error_message, e)
+
 async def perform_copy(ctx, token, source_id, target_id, message) -> Dict:
     """
     Effectue la copie du serveur en arrière-plan.
@@ -186,11 +250,13 @@ async def perform_copy(ctx, token, source_id, target_id, message) -> Dict:
         Un dictionnaire contenant le résultat de l'opération
     """
     # Initialiser l'API Discord
-    discord_api = DiscordAPI(token)
+    discord_api = DiscordAPI.for_token(token)
+    # Les étapes s'enchaînent vite : on ne met à jour le message qu'une fois par intervalle
+    status = Debouncer(message)
     
     try:
         # Étape 1: Vérifier les serveurs source et cible
-        await message.edit(content="🔄 Vérification des serveurs...")
+        status.update("🔄 Vérification des serveurs...")
         
         source_server = await discord_api.get_server(source_id)
         if not source_server:
@@ -204,92 +270,62 @@ async def perform_copy(ctx, token, source_id, target_id, message) -> Dict:
         source_name = source_server.get('name', 'Unknown')
         target_name = target_server.get('name', 'Unknown')
         
-        await message.edit(content=f"🔄 Extraction des données du serveur source: {source_name}...")
-        
-        # Récupérer les canaux
-        await message.edit(content=f"🔄 Récupération des canaux de {source_name}...")
-        channels = await discord_api.get_channels(source_id)
-        await asyncio.sleep(1)
-        
-        # Récupérer les rôles
-        await message.edit(content=f"🔄 Récupération des rôles de {source_name}...")
-        roles = await discord_api.get_roles(source_id)
-        await asyncio.sleep(1)
-        
-        # Récupérer les emojis
-        await message.edit(content=f"🔄 Récupération des emojis de {source_name}...")
-        emojis = await discord_api.get_emojis(source_id)
-        await asyncio.sleep(1)
+        status.update(f"🔄 Extraction des données du serveur source: {source_name}...")
         
-        # Récupérer les stickers
-        await message.edit(content=f"🔄 Récupération des stickers de {source_name}...")
-        stickers = await discord_api.get_stickers(source_id)
-        await asyncio.sleep(1)
+        # Récupérer les canaux, rôles, emojis et stickers en parallèle
+        channels, roles, emojis, stickers = await discord_api.fetch_source_bundle(source_id)
         
         # Étape 3: Nettoyer le serveur cible
-        await message.edit(content=f"⚠️ Nettoyage du serveur cible: {target_name}...")
+        status.update(f"⚠️ Nettoyage du serveur cible: {target_name}...")
         
         try:
             await discord_api.clear_server(target_id)
-            await asyncio.sleep(2)
         except Exception as e:
-            logger.error(f"Erreur lors du nettoyage du serveur: {str(e)}")
+            logger.error("Erreur lors du nettoyage du serveur: %s", e)
             return {'success': False, 'message': f"❌ Erreur lors du nettoyage du serveur cible: {str(e)}"}
         
         # Étape 4: Restaurer la structure sur le serveur cible
         # Créer les rôles
-        await message.edit(content=f"🔄 Création des rôles sur {target_name}...")
+        status.update(f"🔄 Création des rôles sur {target_name}...")
         try:
             role_id_map = await discord_api.restore_roles(target_id, roles)
-            await asyncio.sleep(2)
         except Exception as e:
-            logger.error(f"Erreur lors de la création des rôles: {str(e)}")
+            logger.error("Erreur lors de la création des rôles: %s", e)
             return {'success': False, 'message': f"❌ Erreur lors de la création des rôles: {str(e)}"}
         
-        # Créer les canaux
-        await message.edit(content=f"🔄 Création des canaux sur {target_name}...")
+        # Créer les canaux, emojis et stickers : ils ne dépendent que des rôles,
+        # on les crée donc en parallèle
+        status.update(f"🔄 Création des canaux, emojis et stickers sur {target_name}...")
+        channels_error = None
         try:
-            await discord_api.restore_channels(target_id, channels, role_id_map)
-            await asyncio.sleep(2)
-        except Exception as e:
-            logger.error(f"Erreur lors de la création des canaux: {str(e)}")
-            return {'success': False, 'message': f"❌ Erreur lors de la création des canaux: {str(e)}"}
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(discord_api.restore_channels(target_id, channels, role_id_map))
+                # On continue même si les emojis ou les stickers échouent
+                tg.create_task(run_optional_step(discord_api.restore_emojis(target_id, emojis),
+                                                 "Erreur lors de la création des emojis"))
+                tg.create_task(run_optional_step(discord_api.restore_stickers(target_id, stickers),
+                                                 "Erreur lors de la création des stickers"))
+        except* Exception as group:
+            channels_error = group.exceptions[0]
         
-        # Créer les emojis
-        await message.edit(content=f"🔄 Création des emojis sur {target_name}...")
-        try:
-            await discord_api.restore_emojis(target_id, emojis)
-            await asyncio.sleep(2)
-        except Exception as e:
-            logger.error(f"Erreur lors de la création des emojis: {str(e)}")
-            # On continue même si les emojis échouent
-        
-        # Créer les stickers
-        await message.edit(content=f"🔄 Création des stickers sur {target_name}...")
-        try:
-            await discord_api.restore_stickers(target_id, stickers)
-        except Exception as e:
-            logger.error(f"Erreur lors de la création des stickers: {str(e)}")
-            # On continue même si les stickers échouent
+        if channels_error is not None:
+            logger.error("Erreur lors de la création des canaux: %s", channels_error)
+            return {'success': False, 'message': f"❌ Erreur lors de la création des canaux: {str(channels_error)}"}
         
         # Succès!
         success_message = f"✅ Serveur copié avec succès!\n**Source:** {source_name} (ID: {source_id})\n**Cible:** {target_name} (ID: {target_id})"
-        await message.edit(content=success_message)
+        await status.flush(success_message)
         
         return {'success': True, 'message': success_message}
         
     except Exception as e:
         error_message = f"❌ Erreur pendant la copie du serveur: {str(e)}"
         logger.error(error_message)
-        await message.edit(content=error_message)
+        await status.flush(error_message)
         return {'success': False, 'message': error_message}
     
     finally:
-        # S'assurer que la session est fermée
-        try:
-            await discord_api.close()
-        except:
-            pass
+        DiscordAPI.release_token(token)
 
 def handle_copy_completion(task, ctx):
     """Gère la fin d'une tâche de copie (réussie ou non)."""